@@ -9,6 +9,24 @@ import datetime
 import sqlite3
 from pathlib import Path
 import os
+import importlib.util
+
+from calculs import (
+    ks_par_defaut, calculer_puissances_lignes, construire_arbre, synchroniser_arbre,
+    modifier_ligne_arbre, modifier_ks_arbre, ajouter_noeud_arbre, arbre_vers_dataframe,
+    PLAGES, TARIF_DEFAUT, synthese_couts,
+    MIN_BATIMENTS_CALIBRATION, lire_comptages_par_blocs, accumuler_comptages, statistiques_comptages,
+    calibrer_categories
+)
+from catalogue import (
+    get_types_by_category, get_valeurs_catalogue_par_categorie, get_versions_calibration,
+    enregistrer_calibration
+)
+
+# Dossier des exports de comptage volumineux lisibles depuis le serveur
+DOSSIER_COMPTAGES = Path(os.environ.get('BILAN_DOSSIER_COMPTAGES', 'comptages'))
+# Le format Parquet n'est proposé que si pyarrow est installé
+FORMATS_COMPTAGE = ['csv', 'parquet'] if importlib.util.find_spec('pyarrow') else ['csv']
 
 # Configuration de la page
 st.set_page_config(
@@ -84,6 +102,20 @@ def init_database():
         coefficient REAL DEFAULT 1.0,
         FOREIGN KEY (categorie_id) REFERENCES categories(id)
     );
+    
+    CREATE TABLE IF NOT EXISTS calibrations_catalogue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        version INTEGER NOT NULL,
+        date TEXT,
+        source TEXT,
+        categorie_id INTEGER,
+        facteur_charge REAL,
+        heures_fonction REAL,
+        correction_facteur_charge REAL DEFAULT 1.0,
+        correction_heures REAL DEFAULT 1.0,
+        nb_batiments INTEGER,
+        FOREIGN KEY (categorie_id) REFERENCES categories(id)
+    );
     ''')
     
     # Vérification si la base contient déjà des données
@@ -260,20 +292,6 @@ def get_categories():
     conn.close()
     return df
 
-def get_types_by_category(categorie_id):
-    """Récupère les types d'équipements pour une catégorie"""
-    conn = sqlite3.connect('equipements.db')
-    query = """
-    SELECT t.*, c.nom as categorie_nom 
-    FROM types_equipements t
-    JOIN categories c ON t.categorie_id = c.id
-    WHERE t.categorie_id = ?
-    ORDER BY t.nom
-    """
-    df = pd.read_sql_query(query, conn, params=(categorie_id,))
-    conn.close()
-    return df
-
 def get_modeles_by_type(type_id):
     """Récupère les modèles pour un type d'équipement"""
     conn = sqlite3.connect('equipements.db')
@@ -329,15 +347,37 @@ def get_power_stats_by_category():
     conn.close()
     return df
 
+def get_coefficients_saison():
+    """Récupère les coefficients saisonniers par catégorie sous forme de matrice catégorie × mois"""
+    conn = sqlite3.connect('equipements.db')
+    query = """
+    SELECT c.nom as categorie, s.mois, s.coefficient
+    FROM coefficients_saison s
+    JOIN categories c ON s.categorie_id = c.id
+    """
+    df = pd.read_sql_query(query, conn)
+    conn.close()
+    return df.pivot_table(index='categorie', columns='mois', values='coefficient').reindex(
+        columns=range(1, 13), fill_value=1.0
+    ).fillna(1.0)
+
 # Initialisation de la session state
 if 'equipements' not in st.session_state:
     st.session_state.equipements = pd.DataFrame(columns=[
         'ID', 'Nom', 'Type', 'Catégorie', 'Puissance (kW)', 
         'Quantité', 'Facteur Charge (%)', 'Heures Fonction (h/j)',
-        'Jours Fonction (j/an)', 'Localisation', 'Étage', 
-        'Système', 'Contrôlable', 'Priorité', 'Notes', 'Source_BDD'
+        'Jours Fonction (j/an)', 'Bâtiment', 'Localisation', 'Étage', 
+        'Système', 'Tableau', 'Contrôlable', 'Priorité', 'Notes', 'Source_BDD'
     ])
 
+if 'tableaux' not in st.session_state:
+    st.session_state.tableaux = pd.DataFrame([
+        {'Nom': 'TGBT', 'Parent': '', 'Ks': ks_par_defaut(0)}
+    ])
+
+if 'arbre' not in st.session_state:
+    st.session_state.arbre = construire_arbre(st.session_state.tableaux, st.session_state.equipements)
+
 # Initialisation de la base de données
 init_database()
 
@@ -346,6 +386,9 @@ st.markdown('<h1 class="main-header">📊 Bilan de Puissance avec Base de Donné
 
 # Sidebar
 with st.sidebar:
+    st.markdown("### 🏗️ Bâtiment")
+    batiment_courant = st.text_input("Bâtiment des équipements ajoutés", value="Bâtiment 1")
+    
     st.markdown("### 🔍 Recherche Base de Données")
     
     search_option = st.radio(
@@ -392,9 +435,11 @@ with st.sidebar:
                                     'Facteur Charge (%)': row['facteur_charge'],
                                     'Heures Fonction (h/j)': row['heures_fonction'],
                                     'Jours Fonction (j/an)': 220,
+                                    'Bâtiment': batiment_courant,
                                     'Localisation': '',
                                     'Étage': '',
                                     'Système': '',
+                                    'Tableau': '',
                                     'Contrôlable': True,
                                     'Priorité': 'Moyenne',
                                     'Notes': f"Importé depuis BDD - ID: {row['id']}",
@@ -436,9 +481,11 @@ with st.sidebar:
                                 'Facteur Charge (%)': 70,
                                 'Heures Fonction (h/j)': 10,
                                 'Jours Fonction (j/an)': 220,
+                                'Bâtiment': batiment_courant,
                                 'Localisation': '',
                                 'Étage': '',
                                 'Système': '',
+                                'Tableau': '',
                                 'Contrôlable': True,
                                 'Priorité': 'Moyenne',
                                 'Notes': f"Recherche BDD: {search_term}",
@@ -505,6 +552,12 @@ with st.sidebar:
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
 
+# Indexation dans l'arbre de distribution des lignes ajoutées depuis la barre latérale
+arbre = synchroniser_arbre(st.session_state.arbre, st.session_state.equipements)
+if arbre is None:
+    arbre = construire_arbre(st.session_state.tableaux, st.session_state.equipements)
+st.session_state.arbre = arbre
+
 # Section principale - Gestion des équipements
 st.markdown('<div class="card">', unsafe_allow_html=True)
 st.markdown("### 🏢 Équipements du bâtiment")
@@ -514,7 +567,7 @@ if not st.session_state.equipements.empty:
     st.dataframe(
         st.session_state.equipements[[
             'Nom', 'Catégorie', 'Puissance (kW)', 'Quantité', 
-            'Localisation', 'Étage', 'Priorité', 'Source_BDD'
+            'Bâtiment', 'Localisation', 'Étage', 'Tableau', 'Priorité', 'Source_BDD'
         ]],
         use_container_width=True,
         height=400
@@ -587,6 +640,74 @@ if not st.session_state.equipements.empty:
     with col_z:
         st.metric("Seuil 70kW", "✅ OK" if max_single_power < 70 else "⚠️ DÉPASSÉ")
     
+    # Coût énergétique
+    st.markdown("#### 💶 Coût énergétique annuel")
+    
+    with st.expander("⚙️ Paramètres du tarif"):
+        tarif = dict(TARIF_DEFAUT, prix_kwh=dict(TARIF_DEFAUT['prix_kwh']),
+                     part_heures_creuses=dict(TARIF_DEFAUT['part_heures_creuses']))
+        col_h, col_e, col_p = st.columns(3)
+        with col_h:
+            for plage in PLAGES:
+                tarif['prix_kwh'][('Hiver', plage)] = st.number_input(
+                    f"Hiver - {plage} (€/kWh)", min_value=0.0, step=0.01, format="%.4f",
+                    value=TARIF_DEFAUT['prix_kwh'][('Hiver', plage)], key=f"prix_hiver_{plage}")
+        with col_e:
+            for plage in PLAGES:
+                tarif['prix_kwh'][('Été', plage)] = st.number_input(
+                    f"Été - {plage} (€/kWh)", min_value=0.0, step=0.01, format="%.4f",
+                    value=TARIF_DEFAUT['prix_kwh'][('Été', plage)], key=f"prix_ete_{plage}")
+        with col_p:
+            tarif['prime_puissance'] = st.number_input(
+                "Prime fixe (€/kW souscrit/an)", min_value=0.0, step=1.0,
+                value=TARIF_DEFAUT['prime_puissance'])
+            tarif['heures_pleines_par_jour'] = st.number_input(
+                "Heures pleines par jour", min_value=0, max_value=24,
+                value=TARIF_DEFAUT['heures_pleines_par_jour'])
+            part_creuses_ecs = st.slider("Part de l'ECS en heures creuses (%)", min_value=0, max_value=100,
+                                         value=int(TARIF_DEFAUT['part_heures_creuses']['ECS'] * 100))
+            for categorie in tarif['part_heures_creuses']:
+                if categorie.startswith('ECS'):
+                    tarif['part_heures_creuses'][categorie] = part_creuses_ecs / 100
+            # Par défaut la puissance foisonnée du TGBT (Ks appliqués), répartie entre bâtiments au prorata
+            puissance_souscrite = st.number_input(
+                "Puissance souscrite totale (kW)", min_value=0.0, step=1.0,
+                value=float(np.ceil(arbre['foisonne'][0])))
+    
+    coefficients_saison = get_coefficients_saison()
+    couts_par_categorie = synthese_couts(
+        st.session_state.equipements, coefficients_saison, tarif, puissance_souscrite
+    )
+    couts_par_batiment = synthese_couts(
+        st.session_state.equipements, coefficients_saison, tarif, puissance_souscrite, cle='Bâtiment'
+    )
+    energie_totale = couts_par_categorie['Énergie (kWh/an)'].sum()
+    cout_total = couts_par_categorie['Coût total (€/an)'].sum()
+    
+    col_c1, col_c2, col_c3 = st.columns(3)
+    
+    with col_c1:
+        st.metric("Énergie annuelle", f"{energie_totale:,.0f} kWh")
+    
+    with col_c2:
+        st.metric("Coût annuel estimé", f"{cout_total:,.0f} €")
+    
+    with col_c3:
+        prix_moyen = cout_total / energie_totale if energie_totale > 0 else 0
+        st.metric("Prix moyen", f"{prix_moyen:.4f} €/kWh")
+    
+    fig = px.bar(
+        couts_par_categorie,
+        x='Catégorie',
+        y=['Coût énergie (€/an)', 'Coût abonnement (€/an)'],
+        title='Coût annuel par catégorie (€)'
+    )
+    fig.update_layout(xaxis_tickangle=-45, legend_title_text='')
+    st.plotly_chart(fig, use_container_width=True)
+    
+    st.markdown("##### 🏗️ Factures par bâtiment")
+    st.dataframe(couts_par_batiment, use_container_width=True)
+    
     # Export des données
     st.markdown("#### 📤 Export des données")
     
@@ -595,14 +716,20 @@ if not st.session_state.equipements.empty:
         with pd.ExcelWriter(output, engine='openpyxl') as writer:
             st.session_state.equipements.to_excel(writer, sheet_name='Équipements', index=False)
             power_by_category.to_excel(writer, sheet_name='Par Catégorie', index=False)
+            arbre_vers_dataframe(arbre).to_excel(writer, sheet_name='Par Tableau', index=False)
+            couts_par_categorie.to_excel(writer, sheet_name='Coûts', index=False)
+            couts_par_batiment.to_excel(writer, sheet_name='Coûts par Bâtiment', index=False)
             
             # Ajouter un résumé
             resume_df = pd.DataFrame({
-                'Métrique': ['Puissance totale', 'Nombre équipements', 'Conformité BACS'],
+                'Métrique': ['Puissance totale', 'Nombre équipements', 'Conformité BACS',
+                             'Énergie annuelle', 'Coût annuel estimé'],
                 'Valeur': [
                     f"{total_power:.1f} kW",
                     nb_equip,
-                    "ASSUJETTI" if assujetti else "NON ASSUJETTI"
+                    "ASSUJETTI" if assujetti else "NON ASSUJETTI",
+                    f"{energie_totale:,.0f} kWh",
+                    f"{cout_total:,.0f} €"
                 ]
             })
             resume_df.to_excel(writer, sheet_name='Résumé', index=False)
@@ -636,6 +763,147 @@ else:
 
 st.markdown('</div>', unsafe_allow_html=True)
 
+# Section arbre de distribution
+st.markdown('<div class="card">', unsafe_allow_html=True)
+st.markdown("### 🔌 Arbre de distribution électrique")
+
+col1, col2, col3 = st.columns(3)
+
+with col1:
+    st.markdown("#### ➕ Nouveau tableau")
+    nom_tableau = st.text_input("Nom du tableau", placeholder="Ex: TD Étage 1")
+    parent_tableau = st.selectbox("Tableau amont", arbre['noms'], key="parent_tableau")
+    niveau_tableau = arbre['niveau'][arbre['index'][parent_tableau]] + 1
+    ks_tableau = st.number_input("Ks", min_value=0.0, max_value=1.0,
+                                 value=ks_par_defaut(niveau_tableau), step=0.05, key="ks_nouveau")
+
+    if st.button("➕ Ajouter le tableau"):
+        if nom_tableau and nom_tableau not in arbre['index']:
+            st.session_state.tableaux = pd.concat([st.session_state.tableaux, pd.DataFrame([{
+                'Nom': nom_tableau, 'Parent': parent_tableau, 'Ks': ks_tableau
+            }])], ignore_index=True)
+            ajouter_noeud_arbre(arbre, nom_tableau, parent_tableau, ks_tableau)
+            st.success(f"✅ Tableau '{nom_tableau}' ajouté sous {parent_tableau} !")
+        else:
+            st.warning("Nom de tableau vide ou déjà utilisé.")
+
+with col2:
+    st.markdown("#### ⚙️ Coefficient de simultanéité")
+    tableau_ks = st.selectbox("Tableau", arbre['noms'], key="tableau_ks")
+    noeud_ks = arbre['index'][tableau_ks]
+    nouveau_ks = st.number_input("Nouveau Ks", min_value=0.0, max_value=1.0,
+                                 value=float(arbre['ks'][noeud_ks]), step=0.05, key="ks_modifie")
+
+    if st.button("💾 Appliquer le Ks"):
+        st.session_state.tableaux.loc[noeud_ks, 'Ks'] = nouveau_ks
+        modifier_ks_arbre(arbre, noeud_ks, nouveau_ks)
+        st.success(f"✅ Ks de {tableau_ks} mis à jour !")
+
+with col3:
+    st.markdown("#### 🔀 Affectation des équipements")
+    if not st.session_state.equipements.empty:
+        position = st.selectbox(
+            "Équipement",
+            range(len(st.session_state.equipements)),
+            format_func=lambda i: f"{st.session_state.equipements.iloc[i]['ID']} - {st.session_state.equipements.iloc[i]['Nom']}"
+        )
+        tableau_cible = st.selectbox("Tableau de rattachement", arbre['noms'], key="tableau_cible")
+
+        if st.button("🔀 Rattacher"):
+            st.session_state.equipements.loc[st.session_state.equipements.index[position], 'Tableau'] = tableau_cible
+            modifier_ligne_arbre(arbre, position, arbre['index'][tableau_cible],
+                                 arbre['ligne_installe'][position], arbre['ligne_utilise'][position])
+            st.success(f"✅ Équipement rattaché à {tableau_cible} !")
+    else:
+        st.caption("Aucun équipement à rattacher.")
+
+st.dataframe(arbre_vers_dataframe(arbre), use_container_width=True)
+
+st.markdown('</div>', unsafe_allow_html=True)
+
+# Section calibration sur données de comptage
+st.markdown('<div class="card">', unsafe_allow_html=True)
+st.markdown("### 📈 Calibration du catalogue sur données de comptage")
+
+col1, col2 = st.columns(2)
+
+with col1:
+    fichier_comptage = st.file_uploader(
+        f"Export de comptage ({', '.join(FORMATS_COMPTAGE).upper()})", type=FORMATS_COMPTAGE)
+    # Seuls les fichiers du dossier de comptages configuré sont proposés
+    fichiers_serveur = sorted(
+        chemin for extension in FORMATS_COMPTAGE for chemin in DOSSIER_COMPTAGES.glob(f'*.{extension}')
+    ) if DOSSIER_COMPTAGES.is_dir() else []
+    chemin_comptage = st.selectbox(
+        f"ou fichier volumineux du dossier {DOSSIER_COMPTAGES}",
+        [None] + fichiers_serveur,
+        format_func=lambda chemin: "—" if chemin is None else chemin.name
+    )
+
+with col2:
+    colonne_puissance = st.text_input("Colonne puissance (kW)", value="Puissance (kW)")
+    colonne_batiment = st.text_input("Colonne bâtiment (valeurs = colonne Bâtiment de l'inventaire)", value="Bâtiment")
+    pas_minutes = st.number_input("Pas de mesure (min)", min_value=1, value=10)
+
+source_comptage = chemin_comptage or fichier_comptage
+
+if st.button("📈 Calibrer", use_container_width=True):
+    batiments = st.session_state.equipements['Bâtiment'].fillna('').astype(str)
+    installe, _ = calculer_puissances_lignes(st.session_state.equipements)
+    puissance_batiments = pd.Series(installe, index=st.session_state.equipements.index).groupby(batiments).sum()
+    puissance_batiments = puissance_batiments[puissance_batiments > 0]
+
+    if source_comptage is None or puissance_batiments.empty:
+        st.warning("Un fichier de comptage et un inventaire d'équipements sont nécessaires.")
+    elif not colonne_batiment and len(puissance_batiments) > 1:
+        st.warning("Plusieurs bâtiments dans l'inventaire : indiquez la colonne bâtiment du fichier de comptage.")
+    else:
+        try:
+            with st.spinner("Lecture des comptages..."):
+                histogramme = accumuler_comptages(
+                    lire_comptages_par_blocs(source_comptage, colonne_puissance, colonne_batiment or None),
+                    puissance_batiments, colonne_puissance, colonne_batiment or None
+                )
+            statistiques = statistiques_comptages(histogramme, puissance_batiments, pas_minutes)
+        except (OSError, ValueError, KeyError, ImportError) as erreur:
+            st.error(f"Lecture du fichier de comptage impossible : {erreur}")
+        else:
+            if statistiques.empty:
+                st.warning("Aucune mesure ne correspond aux bâtiments de l'inventaire.")
+            else:
+                st.session_state.calibration = calibrer_categories(
+                    st.session_state.equipements, statistiques, get_valeurs_catalogue_par_categorie()
+                )
+                st.session_state.source_calibration = str(getattr(source_comptage, 'name', source_comptage))
+                st.success(f"✅ Calibration réalisée sur {len(statistiques)} bâtiment(s), "
+                           f"{statistiques['Nombre de jours'].sum():.0f} jours de mesure.")
+
+if 'calibration' in st.session_state and not st.session_state.calibration.empty:
+    st.dataframe(st.session_state.calibration.drop(columns='categorie_id'), use_container_width=True)
+
+    # Seules les catégories observées dans assez de bâtiments modifient le catalogue
+    calibration_fiable = st.session_state.calibration[
+        st.session_state.calibration['Nombre de bâtiments'] >= MIN_BATIMENTS_CALIBRATION
+    ]
+    ecartees = st.session_state.calibration.index.difference(calibration_fiable.index)
+    if len(ecartees) > 0:
+        st.warning(f"Catégories vues dans moins de {MIN_BATIMENTS_CALIBRATION} bâtiments, non enregistrées : "
+                   f"{', '.join(ecartees)}")
+
+    if calibration_fiable.empty:
+        st.info("Aucune catégorie n'a assez de bâtiments mesurés pour modifier le catalogue.")
+    elif st.button("💾 Enregistrer comme nouvelle version du catalogue", use_container_width=True):
+        version = enregistrer_calibration(calibration_fiable, st.session_state.source_calibration)
+        del st.session_state.calibration
+        st.success(f"✅ Version {version} du catalogue enregistrée !")
+
+versions_df = get_versions_calibration()
+if not versions_df.empty:
+    st.markdown("#### 🗂️ Versions du catalogue")
+    st.dataframe(versions_df, use_container_width=True)
+
+st.markdown('</div>', unsafe_allow_html=True)
+
 # Section d'ajout manuel
 st.markdown('<div class="card">', unsafe_allow_html=True)
 st.markdown("### ✍️ Ajout manuel d'équipement")
@@ -654,8 +922,10 @@ with col1:
 with col2:
     facteur_manuel = st.slider("Facteur de charge (%)", min_value=0, max_value=100, value=70)
     heures_manuel = st.number_input("Heures fonctionnement/jour", min_value=0.0, max_value=24.0, value=10.0)
+    batiment_manuel = st.text_input("Bâtiment", value=batiment_courant)
     localisation_manuel = st.text_input("Localisation")
     priorite_manuel = st.selectbox("Priorité", ["Basse", "Moyenne", "Haute"])
+    tableau_manuel = st.selectbox("Tableau", st.session_state.arbre['noms'])
 
 if st.button("➕ Ajouter manuellement", use_container_width=True):
     if nom_manuel and puissance_manuel > 0:
@@ -670,9 +940,11 @@ if st.button("➕ Ajouter manuellement", use_container_width=True):
             'Facteur Charge (%)': facteur_manuel,
             'Heures Fonction (h/j)': heures_manuel,
             'Jours Fonction (j/an)': 220,
+            'Bâtiment': batiment_manuel,
             'Localisation': localisation_manuel,
             'Étage': '',
             'Système': '',
+            'Tableau': tableau_manuel,
             'Contrôlable': True,
             'Priorité': priorite_manuel,
             'Notes': 'Ajout manuel',
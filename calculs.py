@@ -0,0 +1,388 @@
+"""Calculs du bilan de puissance, indépendants de l'interface Streamlit"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Arbre de distribution électrique (TGBT → tableaux divisionnaires → circuits)
+# Coefficients de simultanéité (Ks) par défaut selon le niveau dans l'arbre
+COEFFICIENTS_SIMULTANEITE = {0: 0.8, 1: 0.9}
+KS_CIRCUIT = 1.0
+
+def ks_par_defaut(niveau):
+    """Retourne le coefficient de simultanéité par défaut d'un niveau"""
+    return COEFFICIENTS_SIMULTANEITE.get(niveau, KS_CIRCUIT)
+
+def calculer_puissances_lignes(equipements):
+    """Calcule les puissances installée et utilisée (Ku = facteur de charge) de chaque ligne"""
+    puissance = pd.to_numeric(equipements['Puissance (kW)'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    quantite = pd.to_numeric(equipements['Quantité'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    facteur = pd.to_numeric(equipements['Facteur Charge (%)'], errors='coerce').fillna(100).to_numpy(dtype=float)
+    installe = puissance * quantite
+    return installe, installe * facteur / 100
+
+def indexer_lignes(arbre, equipements):
+    """Retourne l'indice de nœud de chaque ligne (les lignes sans tableau connu vont au TGBT)"""
+    tableaux = equipements['Tableau'].fillna('').astype(str) if 'Tableau' in equipements else pd.Series('', index=equipements.index)
+    return tableaux.map(arbre['index']).fillna(0).to_numpy(dtype=np.int64, copy=True)
+
+def construire_arbre(tableaux, equipements):
+    """Construit l'index de l'arbre et agrège toutes les lignes (reconstruction complète)"""
+    noms = tableaux['Nom'].astype(str).tolist()
+    index = {nom: i for i, nom in enumerate(noms)}
+    parent = tableaux['Parent'].fillna('').astype(str).map(index).fillna(-1).to_numpy(dtype=np.int64)
+    n = len(noms)
+
+    # Niveau de chaque nœud par remontée vectorisée vers la racine
+    niveau = np.zeros(n, dtype=np.int64)
+    courant = parent.copy()
+    while (courant >= 0).any():
+        actifs = courant >= 0
+        niveau[actifs] += 1
+        courant[actifs] = parent[courant[actifs]]
+        if niveau.max(initial=0) > n:
+            raise ValueError("Cycle détecté dans l'arbre de distribution")
+
+    arbre = {
+        'noms': noms,
+        'index': index,
+        'parent': parent,
+        'niveau': niveau,
+        'ks': tableaux['Ks'].to_numpy(dtype=float, copy=True),
+        'installe': np.zeros(n),
+        'brut': np.zeros(n),
+        'foisonne': np.zeros(n),
+    }
+
+    ligne_installe, ligne_utilise = calculer_puissances_lignes(equipements)
+    ligne_noeud = indexer_lignes(arbre, equipements)
+    arbre['ligne_noeud'] = ligne_noeud
+    arbre['ligne_installe'] = ligne_installe
+    arbre['ligne_utilise'] = ligne_utilise
+    arbre['installe'] += np.bincount(ligne_noeud, weights=ligne_installe, minlength=n)
+    arbre['brut'] += np.bincount(ligne_noeud, weights=ligne_utilise, minlength=n)
+
+    # Remontée niveau par niveau : les enfants sont complets avant leur parent
+    for profondeur in range(niveau.max(initial=0), -1, -1):
+        noeuds = np.flatnonzero(niveau == profondeur)
+        arbre['foisonne'][noeuds] = arbre['ks'][noeuds] * arbre['brut'][noeuds]
+        if profondeur > 0:
+            np.add.at(arbre['installe'], parent[noeuds], arbre['installe'][noeuds])
+            np.add.at(arbre['brut'], parent[noeuds], arbre['foisonne'][noeuds])
+
+    return arbre
+
+def propager_delta_arbre(arbre, noeud, delta_installe, delta_utilise):
+    """Répercute une variation sur le seul chemin du nœud vers la racine"""
+    parent = arbre['parent']
+    ks = arbre['ks']
+    while noeud >= 0:
+        arbre['installe'][noeud] += delta_installe
+        arbre['brut'][noeud] += delta_utilise
+        delta_utilise *= ks[noeud]
+        arbre['foisonne'][noeud] += delta_utilise
+        noeud = parent[noeud]
+
+def synchroniser_arbre(arbre, equipements):
+    """Indexe les lignes ajoutées depuis la dernière synchronisation"""
+    nb_lignes = len(arbre['ligne_noeud'])
+    if len(equipements) < nb_lignes:
+        return None
+    nouvelles = equipements.iloc[nb_lignes:]
+    if nouvelles.empty:
+        return arbre
+    installe, utilise = calculer_puissances_lignes(nouvelles)
+    noeuds = indexer_lignes(arbre, nouvelles)
+    for noeud, d_installe, d_utilise in zip(noeuds, installe, utilise):
+        propager_delta_arbre(arbre, noeud, d_installe, d_utilise)
+    arbre['ligne_noeud'] = np.concatenate([arbre['ligne_noeud'], noeuds])
+    arbre['ligne_installe'] = np.concatenate([arbre['ligne_installe'], installe])
+    arbre['ligne_utilise'] = np.concatenate([arbre['ligne_utilise'], utilise])
+    return arbre
+
+def modifier_ligne_arbre(arbre, position, noeud, installe, utilise):
+    """Met à jour une ligne (tableau et/ou puissances) en ne touchant que les chemins concernés"""
+    ancien_noeud = arbre['ligne_noeud'][position]
+    propager_delta_arbre(arbre, ancien_noeud, -arbre['ligne_installe'][position], -arbre['ligne_utilise'][position])
+    propager_delta_arbre(arbre, noeud, installe, utilise)
+    arbre['ligne_noeud'][position] = noeud
+    arbre['ligne_installe'][position] = installe
+    arbre['ligne_utilise'][position] = utilise
+
+def modifier_ks_arbre(arbre, noeud, ks):
+    """Change le Ks d'un tableau et répercute l'écart sur ses ancêtres"""
+    arbre['ks'][noeud] = ks
+    delta = ks * arbre['brut'][noeud] - arbre['foisonne'][noeud]
+    arbre['foisonne'][noeud] += delta
+    propager_delta_arbre(arbre, arbre['parent'][noeud], 0.0, delta)
+
+def ajouter_noeud_arbre(arbre, nom, parent_nom, ks):
+    """Ajoute un tableau vide sous un parent existant sans réagréger l'arbre"""
+    parent = arbre['index'][parent_nom]
+    arbre['index'][nom] = len(arbre['noms'])
+    arbre['noms'].append(nom)
+    arbre['parent'] = np.append(arbre['parent'], parent)
+    arbre['niveau'] = np.append(arbre['niveau'], arbre['niveau'][parent] + 1)
+    arbre['ks'] = np.append(arbre['ks'], ks)
+    for cle in ('installe', 'brut', 'foisonne'):
+        arbre[cle] = np.append(arbre[cle], 0.0)
+
+def arbre_vers_dataframe(arbre):
+    """Présente le bilan par tableau sous forme de tableau"""
+    parent = arbre['parent']
+    return pd.DataFrame({
+        'Tableau': arbre['noms'],
+        'Parent': [arbre['noms'][p] if p >= 0 else '' for p in parent],
+        'Niveau': arbre['niveau'],
+        'Ks': arbre['ks'],
+        'Puissance installée (kW)': arbre['installe'],
+        'Puissance foisonnée (kW)': arbre['foisonne'],
+    })
+
+# Moteur de tarification énergétique
+JOURS_PAR_MOIS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+SAISONS = ['Hiver', 'Été']
+PLAGES = ['Heures pleines', 'Heures creuses']
+
+# Tarif par défaut (€ HT) : prix du kWh par saison et plage horaire, prime fixe par kW souscrit
+TARIF_DEFAUT = {
+    'prix_kwh': {
+        ('Hiver', 'Heures pleines'): 0.2100,
+        ('Hiver', 'Heures creuses'): 0.1500,
+        ('Été', 'Heures pleines'): 0.1700,
+        ('Été', 'Heures creuses'): 0.1200,
+    },
+    'prime_puissance': 35.0,
+    'mois_hiver': [1, 2, 3, 11, 12],
+    'heures_pleines_par_jour': 16,
+    # Part minimale de l'énergie consommée en heures creuses, par catégorie (ECS asservie aux heures creuses)
+    'part_heures_creuses': {
+        'ECS - Ballon électrique': 1.0,
+        'ECS - Thermodynamique': 1.0,
+        'ECS': 1.0,
+    },
+}
+
+def calculer_energie_lignes(equipements, coefficients, tarif):
+    """Calcule l'énergie annuelle (kWh) de chaque ligne par saison × plage horaire"""
+    _, utilise = calculer_puissances_lignes(equipements)
+    heures = pd.to_numeric(equipements['Heures Fonction (h/j)'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    jours = pd.to_numeric(equipements['Jours Fonction (j/an)'], errors='coerce').fillna(0).to_numpy(dtype=float)
+
+    # Poids saisonnier par catégorie : part de l'année pondérée par les coefficients mensuels
+    hiver = np.isin(np.arange(1, 13), tarif['mois_hiver'])
+    mensuel = coefficients.to_numpy(dtype=float) * JOURS_PAR_MOIS / 365
+    poids = np.vstack([
+        np.column_stack([mensuel[:, hiver].sum(axis=1), mensuel[:, ~hiver].sum(axis=1)]),
+        [hiver @ JOURS_PAR_MOIS / 365, ~hiver @ JOURS_PAR_MOIS / 365],
+    ])
+
+    # Catégories absentes du catalogue (ajouts manuels) : coefficient neutre, dernière ligne de poids
+    categorie = equipements['Catégorie'].astype(str).map(
+        {nom: i for i, nom in enumerate(coefficients.index)}
+    ).fillna(len(coefficients)).to_numpy(dtype=np.int64)
+
+    # Les heures au-delà de la plage pleine journalière basculent en heures creuses,
+    # sans descendre sous la part en heures creuses imposée par le tarif pour la catégorie
+    part_creuses = np.divide(
+        np.clip(heures - tarif['heures_pleines_par_jour'], 0, None), heures,
+        out=np.zeros_like(heures), where=heures > 0
+    )
+    part_categorie = equipements['Catégorie'].astype(str).map(
+        tarif.get('part_heures_creuses', {})
+    ).fillna(0).to_numpy(dtype=float)
+    part_creuses = np.clip(np.maximum(part_creuses, part_categorie), 0, 1)
+    plages = np.column_stack([1 - part_creuses, part_creuses])
+
+    energie = utilise * heures * jours
+    return energie[:, None, None] * poids[categorie][:, :, None] * plages[:, None, :]
+
+def calculer_couts_lignes(equipements, coefficients, tarif, puissance_souscrite=None):
+    """Valorise l'énergie de chaque ligne et lui affecte sa part de prime fixe"""
+    energie = calculer_energie_lignes(equipements, coefficients, tarif)
+    prix = np.array([[tarif['prix_kwh'][(saison, plage)] for plage in PLAGES] for saison in SAISONS])
+    cout_energie = (energie * prix).sum(axis=(1, 2))
+
+    # Puissance souscrite : un nombre est la puissance souscrite totale du site (en pratique la puissance
+    # foisonnée du TGBT), répartie au prorata de Σ P·Ku ; un dict donne la valeur par bâtiment.
+    # Sans valeur, Σ P·Ku de chaque bâtiment sans coefficient de simultanéité : majorant prudent,
+    # réservé aux portefeuilles pour lesquels aucun arbre de distribution n'est disponible.
+    # La prime de chaque bâtiment est ensuite répartie sur ses lignes au prorata de leur puissance utilisée.
+    _, utilise = calculer_puissances_lignes(equipements)
+    batiments = equipements['Bâtiment'] if 'Bâtiment' in equipements else pd.Series('', index=equipements.index)
+    codes, uniques = pd.factorize(batiments.fillna('').astype(str))
+    utilise_batiment = np.bincount(codes, weights=utilise, minlength=len(uniques))
+    if puissance_souscrite is None:
+        souscrite = utilise_batiment
+    elif isinstance(puissance_souscrite, dict):
+        souscrite = pd.Series(uniques).map(puissance_souscrite).fillna(
+            pd.Series(utilise_batiment)).to_numpy(dtype=float)
+    else:
+        total = utilise_batiment.sum()
+        souscrite = float(puissance_souscrite) * np.divide(
+            utilise_batiment, total, out=np.zeros_like(utilise_batiment), where=total > 0)
+    part = np.divide(utilise, utilise_batiment[codes],
+                     out=np.zeros_like(utilise), where=utilise_batiment[codes] > 0)
+    cout_abonnement = tarif['prime_puissance'] * souscrite[codes] * part
+
+    return energie.sum(axis=(1, 2)), cout_energie, cout_abonnement
+
+def synthese_couts(equipements, coefficients, tarif, puissance_souscrite=None, cle='Catégorie'):
+    """Agrège énergie et coûts annuels par catégorie, bâtiment ou toute autre colonne"""
+    energie, cout_energie, cout_abonnement = calculer_couts_lignes(
+        equipements, coefficients, tarif, puissance_souscrite
+    )
+    codes, uniques = pd.factorize(equipements[cle].fillna('').astype(str))
+    synthese = pd.DataFrame({
+        cle: uniques,
+        'Énergie (kWh/an)': np.bincount(codes, weights=energie, minlength=len(uniques)),
+        'Coût énergie (€/an)': np.bincount(codes, weights=cout_energie, minlength=len(uniques)),
+        'Coût abonnement (€/an)': np.bincount(codes, weights=cout_abonnement, minlength=len(uniques)),
+    })
+    synthese['Coût total (€/an)'] = synthese['Coût énergie (€/an)'] + synthese['Coût abonnement (€/an)']
+    return synthese.sort_values('Coût total (€/an)', ascending=False, ignore_index=True)
+
+# Calibration du catalogue sur les courbes de charge mesurées
+# Histogramme de la puissance mesurée rapportée à la puissance installée du bâtiment
+NB_CLASSES_CHARGE = 300
+CHARGE_MAX = 1.5
+QUANTILE_POINTE = 0.95
+# Nombre minimal de bâtiments mesurés pour qu'une catégorie calibrée soit enregistrée
+MIN_BATIMENTS_CALIBRATION = 3
+
+def lire_comptages_par_blocs(fichier, colonne_puissance, colonne_batiment=None, taille_bloc=1_000_000):
+    """Lit un export de comptage CSV ou Parquet bloc par bloc sans le charger en mémoire"""
+    colonnes = [colonne_puissance] + ([colonne_batiment] if colonne_batiment else [])
+    nom = str(getattr(fichier, 'name', fichier)).lower()
+
+    if nom.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        # Fichier local projeté en mémoire, seules les colonnes utiles sont décodées
+        if isinstance(fichier, (str, Path)):
+            parquet = pq.ParquetFile(fichier, memory_map=True)
+        else:
+            parquet = pq.ParquetFile(fichier)
+        for lot in parquet.iter_batches(batch_size=taille_bloc, columns=colonnes):
+            yield lot.to_pandas()
+    else:
+        yield from pd.read_csv(
+            fichier, usecols=colonnes, chunksize=taille_bloc,
+            dtype={colonne_batiment: str} if colonne_batiment else None
+        )
+
+def accumuler_comptages(blocs, puissance_batiments, colonne_puissance, colonne_batiment=None):
+    """Accumule par bâtiment l'histogramme de charge et le nombre de pas de mesure (mémoire constante)"""
+    batiments = list(puissance_batiments.index)
+    index = {batiment: i for i, batiment in enumerate(batiments)}
+    installe = puissance_batiments.to_numpy(dtype=float)
+    histogramme = np.zeros((len(batiments), NB_CLASSES_CHARGE))
+
+    for bloc in blocs:
+        puissance = pd.to_numeric(bloc[colonne_puissance], errors='coerce').to_numpy(dtype=float)
+        if colonne_batiment:
+            codes = bloc[colonne_batiment].astype(str).map(index).fillna(-1).to_numpy(dtype=np.int64)
+        else:
+            codes = np.zeros(len(bloc), dtype=np.int64)
+
+        # Mesures hors inventaire ou invalides ignorées
+        valides = (codes >= 0) & np.isfinite(puissance)
+        codes = codes[valides]
+        charge = puissance[valides] / installe[codes]
+        classes = np.clip((charge / CHARGE_MAX * NB_CLASSES_CHARGE).astype(np.int64), 0, NB_CLASSES_CHARGE - 1)
+        histogramme += np.bincount(
+            codes * NB_CLASSES_CHARGE + classes, minlength=histogramme.size
+        ).reshape(histogramme.shape)
+
+    return pd.DataFrame(histogramme, index=batiments)
+
+def statistiques_comptages(histogramme, puissance_batiments, pas_minutes):
+    """Déduit de l'histogramme la puissance de pointe et l'énergie journalière moyenne de chaque bâtiment"""
+    comptes = histogramme.to_numpy()
+    nb_pas = comptes.sum(axis=1)
+    centres = (np.arange(NB_CLASSES_CHARGE) + 0.5) * CHARGE_MAX / NB_CLASSES_CHARGE
+    installe = puissance_batiments.reindex(histogramme.index).to_numpy(dtype=float)
+
+    cumul = comptes.cumsum(axis=1)
+    classe_pointe = np.argmax(cumul >= QUANTILE_POINTE * nb_pas[:, None], axis=1)
+    charge_moyenne = np.divide(comptes @ centres, nb_pas, out=np.zeros_like(nb_pas), where=nb_pas > 0)
+
+    return pd.DataFrame({
+        'Nombre de jours': nb_pas * pas_minutes / 1440,
+        'Puissance de pointe (kW)': centres[classe_pointe] * installe,
+        'Énergie journalière (kWh/j)': charge_moyenne * installe * 24,
+    }, index=histogramme.index)[nb_pas > 0]
+
+def calibrer_categories(equipements, statistiques, catalogue, regularisation=0.1):
+    """Ajuste par moindres carrés régularisés le facteur de charge et les heures de fonctionnement par catégorie"""
+    batiments = equipements['Bâtiment'] if 'Bâtiment' in equipements else pd.Series('', index=equipements.index)
+    installe, utilise = calculer_puissances_lignes(equipements)
+    jours = pd.to_numeric(equipements['Jours Fonction (j/an)'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    heures = pd.to_numeric(equipements['Heures Fonction (h/j)'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    categories = list(catalogue.index)
+
+    # Matrices de conception bâtiment × catégorie : puissance installée et puissance × part de jours de fonctionnement
+    lignes = batiments.fillna('').astype(str).map(
+        {batiment: i for i, batiment in enumerate(statistiques.index)}
+    ).fillna(-1).to_numpy(dtype=np.int64)
+    colonnes = equipements['Catégorie'].astype(str).map(
+        {categorie: j for j, categorie in enumerate(categories)}
+    ).fillna(-1).to_numpy(dtype=np.int64)
+    retenues = (lignes >= 0) & (colonnes >= 0)
+    cellules = lignes[retenues] * len(categories) + colonnes[retenues]
+    forme = (len(statistiques), len(categories))
+    puissance = np.bincount(cellules, weights=installe[retenues], minlength=forme[0] * forme[1]).reshape(forme)
+    energie = np.bincount(cellules, weights=(installe * jours / 365)[retenues],
+                          minlength=forme[0] * forme[1]).reshape(forme)
+
+    # Les lignes hors catalogue (ajouts manuels) restent dans les mesures : leur contribution connue,
+    # calculée avec le Ku et les heures de l'inventaire, est retranchée des cibles
+    hors_catalogue = (lignes >= 0) & (colonnes < 0)
+    pointe_hors_catalogue = np.bincount(lignes[hors_catalogue], weights=utilise[hors_catalogue],
+                                        minlength=forme[0])
+    energie_hors_catalogue = np.bincount(lignes[hors_catalogue],
+                                         weights=(utilise * jours / 365 * heures)[hors_catalogue],
+                                         minlength=forme[0])
+    pointe = statistiques['Puissance de pointe (kW)'].to_numpy() - pointe_hors_catalogue
+    energie_journaliere = statistiques['Énergie journalière (kWh/j)'].to_numpy() - energie_hors_catalogue
+
+    # Pointe ≈ Σ P·Ku et énergie journalière ≈ Σ P·(j/365)·Ku·h, rappelés vers les valeurs du catalogue
+    ku_initial = catalogue['facteur_charge'].to_numpy(dtype=float) / 100
+    kh_initial = ku_initial * catalogue['heures_fonction'].to_numpy(dtype=float)
+
+    def moindres_carres(matrice, cible, initial):
+        poids = np.sqrt(regularisation * max(np.mean(np.sum(matrice ** 2, axis=0)), 1e-12))
+        systeme = np.vstack([matrice, poids * np.eye(len(initial))])
+        second_membre = np.concatenate([cible, poids * initial])
+        return np.linalg.lstsq(systeme, second_membre, rcond=None)[0]
+
+    ku = np.clip(moindres_carres(puissance, pointe, ku_initial), 0.01, 1.0)
+    kh = np.clip(moindres_carres(energie, energie_journaliere, kh_initial), 0, None)
+
+    calibration = pd.DataFrame({
+        'categorie_id': catalogue['categorie_id'].to_numpy(),
+        'Facteur charge catalogue (%)': ku_initial * 100,
+        'Facteur charge calibré (%)': ku * 100,
+        'Heures catalogue (h/j)': catalogue['heures_fonction'].to_numpy(dtype=float),
+        'Heures calibrées (h/j)': np.clip(kh / ku, 0, 24),
+        'Nombre de bâtiments': (puissance > 0).sum(axis=0),
+    }, index=pd.Index(categories, name='Catégorie'))
+    return calibration[calibration['Nombre de bâtiments'] > 0]
+
+def facteur_correction(valeurs, cible, plafond, iterations=60):
+    """Coefficient c tel que la moyenne des min(plafond, valeur × c) atteigne la cible (au mieux le plafond)"""
+    valeurs = np.asarray(valeurs, dtype=float)
+    positives = valeurs[valeurs > 0]
+    if positives.size == 0:
+        return 1.0
+
+    # La moyenne plafonnée croît avec c : dichotomie jusqu'au coefficient qui plafonne tous les types
+    bas, haut = 0.0, plafond / positives.min()
+    for _ in range(iterations):
+        milieu = (bas + haut) / 2
+        if np.minimum(plafond, valeurs * milieu).mean() < cible:
+            bas = milieu
+        else:
+            haut = milieu
+    return haut
@@ -0,0 +1,116 @@
+"""Accès au catalogue d'équipements et à ses surcouches de calibration"""
+
+import datetime
+import sqlite3
+
+import pandas as pd
+
+from calculs import facteur_correction
+
+BASE_DONNEES = 'equipements.db'
+
+# Dernière calibration de chaque catégorie, jointe aux types (alias t) de la catégorie
+JOINTURE_CALIBRATION = """
+    LEFT JOIN calibrations_catalogue k ON k.categorie_id = t.categorie_id
+        AND k.version = (SELECT MAX(version) FROM calibrations_catalogue WHERE categorie_id = t.categorie_id)
+"""
+# Valeurs corrigées d'un type, plafonnées : seule définition utilisée par l'interface et la calibration
+FACTEUR_CHARGE_CORRIGE = "MIN(100, t.facteur_charge * COALESCE(k.correction_facteur_charge, 1))"
+HEURES_CORRIGEES = "MIN(24, t.heures_fonction * COALESCE(k.correction_heures, 1))"
+PLAFOND_FACTEUR_CHARGE = 100
+PLAFOND_HEURES = 24
+
+def get_types_by_category(categorie_id, base=BASE_DONNEES):
+    """Récupère les types d'équipements pour une catégorie (corrigés par la dernière calibration si elle existe)"""
+    conn = sqlite3.connect(base)
+    query = f"""
+    SELECT 
+        t.id,
+        t.categorie_id,
+        t.nom,
+        t.puissance_moyenne,
+        t.puissance_min,
+        t.puissance_max,
+        {FACTEUR_CHARGE_CORRIGE} as facteur_charge,
+        {HEURES_CORRIGEES} as heures_fonction,
+        c.nom as categorie_nom 
+    FROM types_equipements t
+    JOIN categories c ON t.categorie_id = c.id
+    {JOINTURE_CALIBRATION}
+    WHERE t.categorie_id = ?
+    ORDER BY t.nom
+    """
+    df = pd.read_sql_query(query, conn, params=(categorie_id,))
+    conn.close()
+    return df
+
+def get_valeurs_catalogue_par_categorie(base=BASE_DONNEES):
+    """Récupère le facteur de charge et les heures de fonctionnement en vigueur par catégorie (moyenne des types)"""
+    conn = sqlite3.connect(base)
+    query = f"""
+    SELECT
+        c.id as categorie_id,
+        c.nom as categorie,
+        AVG({FACTEUR_CHARGE_CORRIGE}) as facteur_charge,
+        AVG({HEURES_CORRIGEES}) as heures_fonction
+    FROM categories c
+    JOIN types_equipements t ON t.categorie_id = c.id
+    {JOINTURE_CALIBRATION}
+    GROUP BY c.id, c.nom
+    """
+    df = pd.read_sql_query(query, conn)
+    conn.close()
+    return df.set_index('categorie')
+
+def get_versions_calibration(base=BASE_DONNEES):
+    """Récupère l'historique des versions de calibration du catalogue"""
+    conn = sqlite3.connect(base)
+    query = """
+    SELECT version, date, source, COUNT(*) as nb_categories, MAX(nb_batiments) as nb_batiments
+    FROM calibrations_catalogue
+    GROUP BY version, date, source
+    ORDER BY version DESC
+    """
+    df = pd.read_sql_query(query, conn)
+    conn.close()
+    return df
+
+def enregistrer_calibration(calibration, source, base=BASE_DONNEES):
+    """Enregistre la calibration comme nouvelle version de surcouche du catalogue"""
+    conn = sqlite3.connect(base)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM calibrations_catalogue")
+    version = cursor.fetchone()[0]
+    date = datetime.datetime.now().strftime('%Y-%m-%d %H:%M')
+
+    # Coefficient correcteur commun aux types de la catégorie : les écarts entre types sont conservés
+    # et la moyenne des valeurs plafonnées vaut la valeur calibrée
+    types_df = pd.read_sql_query(
+        "SELECT categorie_id, facteur_charge, heures_fonction FROM types_equipements", conn
+    )
+    lignes = []
+    for _, row in calibration.iterrows():
+        categorie_id = int(row['categorie_id'])
+        types_categorie = types_df[types_df['categorie_id'] == categorie_id]
+        facteur = float(row['Facteur charge calibré (%)'])
+        heures = float(row['Heures calibrées (h/j)'])
+        lignes.append((
+            version, date, source, categorie_id, facteur, heures,
+            facteur_correction(types_categorie['facteur_charge'].to_numpy(dtype=float), facteur,
+                               PLAFOND_FACTEUR_CHARGE),
+            facteur_correction(types_categorie['heures_fonction'].to_numpy(dtype=float), heures,
+                               PLAFOND_HEURES),
+            int(row['Nombre de bâtiments'])
+        ))
+
+    cursor.executemany(
+        """INSERT INTO calibrations_catalogue
+        (version, date, source, categorie_id, facteur_charge, heures_fonction,
+         correction_facteur_charge, correction_heures, nb_batiments)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        lignes
+    )
+
+    conn.commit()
+    conn.close()
+    return version
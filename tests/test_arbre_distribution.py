@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculs import (
+    ks_par_defaut, construire_arbre, synchroniser_arbre, modifier_ligne_arbre,
+    modifier_ks_arbre, ajouter_noeud_arbre, arbre_vers_dataframe
+)
+
+
+def equipement(puissance, quantite=1, facteur=100, tableau=''):
+    return {
+        'Puissance (kW)': puissance,
+        'Quantité': quantite,
+        'Facteur Charge (%)': facteur,
+        'Tableau': tableau,
+    }
+
+
+@pytest.fixture
+def tableaux():
+    return pd.DataFrame([
+        {'Nom': 'TGBT', 'Parent': '', 'Ks': 0.8},
+        {'Nom': 'TD1', 'Parent': 'TGBT', 'Ks': 0.5},
+        {'Nom': 'TD2', 'Parent': 'TGBT', 'Ks': 1.0},
+        {'Nom': 'C1', 'Parent': 'TD1', 'Ks': 1.0},
+    ])
+
+
+@pytest.fixture
+def equipements():
+    return pd.DataFrame([
+        equipement(10, 2, 50, 'C1'),
+        equipement(4, 1, 100, 'TD2'),
+        equipement(1, 1, 100, ''),
+    ])
+
+
+def test_ks_par_defaut():
+    assert ks_par_defaut(0) == 0.8
+    assert ks_par_defaut(1) == 0.9
+    assert ks_par_defaut(5) == 1.0
+
+
+def test_construire_arbre(tableaux, equipements):
+    arbre = construire_arbre(tableaux, equipements)
+
+    assert list(arbre['niveau']) == [0, 1, 1, 2]
+    np.testing.assert_allclose(arbre['installe'], [25, 20, 4, 20])
+    # C1 : 10 ; TD1 : 0.5 × 10 ; TD2 : 4 ; TGBT : 0.8 × (5 + 4 + 1)
+    np.testing.assert_allclose(arbre['foisonne'], [8, 5, 4, 10])
+
+
+def test_construire_arbre_vide(tableaux):
+    vide = pd.DataFrame(columns=['Puissance (kW)', 'Quantité', 'Facteur Charge (%)', 'Tableau'])
+    arbre = construire_arbre(tableaux, vide)
+
+    assert arbre['installe'].sum() == 0
+    assert len(arbre['ligne_noeud']) == 0
+
+
+def test_construire_arbre_cycle():
+    tableaux = pd.DataFrame([
+        {'Nom': 'A', 'Parent': 'B', 'Ks': 1.0},
+        {'Nom': 'B', 'Parent': 'A', 'Ks': 1.0},
+    ])
+    with pytest.raises(ValueError):
+        construire_arbre(tableaux, pd.DataFrame([equipement(1)]))
+
+
+def test_modifications_incrementales_identiques_a_la_reconstruction(tableaux, equipements):
+    arbre = construire_arbre(tableaux, equipements)
+
+    modifier_ligne_arbre(arbre, 0, arbre['index']['TD2'], 30.0, 12.0)
+    equipements.loc[0] = equipement(30, 1, 40, 'TD2')
+    modifier_ks_arbre(arbre, arbre['index']['TD1'], 0.7)
+    tableaux.loc[1, 'Ks'] = 0.7
+
+    ajouter_noeud_arbre(arbre, 'C2', 'TD2', 0.9)
+    tableaux.loc[len(tableaux)] = {'Nom': 'C2', 'Parent': 'TD2', 'Ks': 0.9}
+    equipements.loc[len(equipements)] = equipement(2, 3, 50, 'C2')
+    synchroniser_arbre(arbre, equipements)
+
+    reference = construire_arbre(tableaux, equipements)
+    np.testing.assert_allclose(arbre['installe'], reference['installe'])
+    np.testing.assert_allclose(arbre['foisonne'], reference['foisonne'])
+    np.testing.assert_array_equal(arbre['ligne_noeud'], reference['ligne_noeud'])
+
+
+def test_synchroniser_arbre_lignes_supprimees(tableaux, equipements):
+    arbre = construire_arbre(tableaux, equipements)
+
+    assert synchroniser_arbre(arbre, equipements.iloc[:1]) is None
+
+
+def test_construire_arbre_ne_modifie_pas_les_tableaux(tableaux, equipements):
+    arbre = construire_arbre(tableaux, equipements)
+    modifier_ks_arbre(arbre, 0, 0.1)
+
+    assert tableaux.loc[0, 'Ks'] == 0.8
+
+
+def test_arbre_vers_dataframe(tableaux, equipements):
+    bilan = arbre_vers_dataframe(construire_arbre(tableaux, equipements))
+
+    assert list(bilan['Tableau']) == ['TGBT', 'TD1', 'TD2', 'C1']
+    assert list(bilan['Parent']) == ['', 'TGBT', 'TGBT', 'TD1']
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculs import (
+    CHARGE_MAX, NB_CLASSES_CHARGE, lire_comptages_par_blocs, accumuler_comptages,
+    statistiques_comptages, calibrer_categories
+)
+
+KU = {'CVC': 0.5, 'Éclairage': 0.9}
+HEURES = {'CVC': 12, 'Éclairage': 8}
+PAS_MINUTES = 10
+
+
+@pytest.fixture
+def equipements():
+    puissances = {'A': (10, 5), 'B': (20, 2), 'C': (4, 8), 'D': (15, 15)}
+    return pd.DataFrame([
+        {
+            'Bâtiment': batiment, 'Catégorie': categorie, 'Puissance (kW)': puissance, 'Quantité': 1,
+            'Facteur Charge (%)': 70, 'Heures Fonction (h/j)': 10, 'Jours Fonction (j/an)': 365,
+        }
+        for batiment, (cvc, eclairage) in puissances.items()
+        for categorie, puissance in (('CVC', cvc), ('Éclairage', eclairage))
+    ])
+
+
+@pytest.fixture
+def catalogue():
+    return pd.DataFrame({
+        'categorie_id': [1, 2, 3],
+        'facteur_charge': [70.0, 100.0, 60.0],
+        'heures_fonction': [10.0, 10.0, 9.0],
+    }, index=pd.Index(['CVC', 'Éclairage', 'Bureautique'], name='categorie'))
+
+
+@pytest.fixture
+def comptages(equipements):
+    # 30 jours de mesures : chaque catégorie tourne à Ku·P pendant ses heures, à partir de minuit
+    heure = np.arange(30 * 144) % 144 * PAS_MINUTES / 60
+    mesures = []
+    for batiment, lignes in equipements.groupby('Bâtiment'):
+        puissance = sum(
+            ligne['Puissance (kW)'] * KU[ligne['Catégorie']] * (heure < HEURES[ligne['Catégorie']])
+            for _, ligne in lignes.iterrows()
+        )
+        mesures.append(pd.DataFrame({'compteur': batiment, 'kw': puissance}))
+    return pd.concat(mesures, ignore_index=True)
+
+
+@pytest.fixture
+def puissance_batiments(equipements):
+    return equipements.groupby('Bâtiment')['Puissance (kW)'].sum().astype(float)
+
+
+def test_lecture_csv_par_blocs(tmp_path, comptages):
+    chemin = tmp_path / 'comptages.csv'
+    comptages.to_csv(chemin, index=False)
+
+    blocs = list(lire_comptages_par_blocs(chemin, 'kw', 'compteur', taille_bloc=1000))
+
+    assert len(blocs) == int(np.ceil(len(comptages) / 1000))
+    assert all(set(bloc.columns) == {'kw', 'compteur'} for bloc in blocs)
+    assert sum(len(bloc) for bloc in blocs) == len(comptages)
+
+
+def test_histogramme_independant_du_decoupage(comptages, puissance_batiments):
+    entier = accumuler_comptages([comptages], puissance_batiments, 'kw', 'compteur')
+    decoupe = accumuler_comptages(
+        (comptages.iloc[i:i + 777] for i in range(0, len(comptages), 777)),
+        puissance_batiments, 'kw', 'compteur'
+    )
+
+    assert entier.shape == (4, NB_CLASSES_CHARGE)
+    np.testing.assert_array_equal(entier.to_numpy(), decoupe.to_numpy())
+    assert entier.to_numpy().sum() == len(comptages)
+
+
+def test_mesures_hors_inventaire_ignorees(comptages, puissance_batiments):
+    inconnus = comptages.assign(compteur='Z')
+    histogramme = accumuler_comptages([comptages, inconnus], puissance_batiments, 'kw', 'compteur')
+
+    assert histogramme.to_numpy().sum() == len(comptages)
+
+
+def test_statistiques_comptages(comptages, puissance_batiments):
+    histogramme = accumuler_comptages([comptages], puissance_batiments, 'kw', 'compteur')
+    statistiques = statistiques_comptages(histogramme, puissance_batiments, PAS_MINUTES)
+    resolution = CHARGE_MAX / NB_CLASSES_CHARGE * puissance_batiments
+
+    np.testing.assert_allclose(statistiques['Nombre de jours'], 30)
+    # Bâtiment A : 10 × 0.5 + 5 × 0.9 en pointe ; 5 × 12 + 4.5 × 8 kWh par jour
+    assert statistiques.loc['A', 'Puissance de pointe (kW)'] == pytest.approx(9.5, abs=resolution['A'])
+    assert statistiques.loc['A', 'Énergie journalière (kWh/j)'] == pytest.approx(96, abs=24 * resolution['A'])
+
+
+def test_calibrer_categories(equipements, catalogue, comptages, puissance_batiments):
+    histogramme = accumuler_comptages([comptages], puissance_batiments, 'kw', 'compteur')
+    statistiques = statistiques_comptages(histogramme, puissance_batiments, PAS_MINUTES)
+
+    calibration = calibrer_categories(equipements, statistiques, catalogue, regularisation=1e-6)
+
+    assert list(calibration.index) == ['CVC', 'Éclairage']
+    np.testing.assert_allclose(calibration['Facteur charge calibré (%)'], [50, 90], rtol=0.02)
+    np.testing.assert_allclose(calibration['Heures calibrées (h/j)'], [12, 8], rtol=0.03)
+    np.testing.assert_array_equal(calibration['Nombre de bâtiments'], [4, 4])
+
+
+def test_lignes_hors_catalogue_retranchees(catalogue):
+    # Chaque bâtiment : une ligne du catalogue et une ligne manuelle hors catalogue, toutes à Ku 0.5 pendant 10 h
+    puissances = {'A': (10, 10), 'B': (20, 5), 'C': (5, 15), 'D': (12, 8)}
+    equipements = pd.DataFrame([
+        {
+            'Bâtiment': batiment, 'Catégorie': categorie, 'Puissance (kW)': puissance, 'Quantité': 1,
+            'Facteur Charge (%)': 50, 'Heures Fonction (h/j)': 10, 'Jours Fonction (j/an)': 365,
+        }
+        for batiment, (catalogue_kw, manuel_kw) in puissances.items()
+        for categorie, puissance in (('CVC', catalogue_kw), ('Manuel', manuel_kw))
+    ])
+    heure = np.arange(30 * 144) % 144 * PAS_MINUTES / 60
+    comptages = pd.concat([
+        pd.DataFrame({'compteur': batiment, 'kw': (catalogue_kw + manuel_kw) * 0.5 * (heure < 10)})
+        for batiment, (catalogue_kw, manuel_kw) in puissances.items()
+    ], ignore_index=True)
+    puissance_batiments = equipements.groupby('Bâtiment')['Puissance (kW)'].sum().astype(float)
+
+    histogramme = accumuler_comptages([comptages], puissance_batiments, 'kw', 'compteur')
+    statistiques = statistiques_comptages(histogramme, puissance_batiments, PAS_MINUTES)
+    calibration = calibrer_categories(equipements, statistiques, catalogue, regularisation=1e-6)
+
+    assert list(calibration.index) == ['CVC']
+    assert calibration.loc['CVC', 'Facteur charge calibré (%)'] == pytest.approx(50, rel=0.02)
+    assert calibration.loc['CVC', 'Heures calibrées (h/j)'] == pytest.approx(10, rel=0.03)
+
+
+def test_regularisation_vers_le_catalogue(equipements, catalogue):
+    # Un seul bâtiment : le problème est sous-déterminé, la régularisation le rappelle au catalogue
+    statistiques = pd.DataFrame({
+        'Nombre de jours': [30.0],
+        'Puissance de pointe (kW)': [10 * 0.7 + 5 * 1.0],
+        'Énergie journalière (kWh/j)': [10 * 0.7 * 10 + 5 * 1.0 * 10],
+    }, index=['A'])
+
+    calibration = calibrer_categories(equipements, statistiques, catalogue)
+
+    np.testing.assert_allclose(calibration['Facteur charge calibré (%)'], [70, 100], rtol=1e-6)
+    np.testing.assert_allclose(calibration['Heures calibrées (h/j)'], [10, 10], rtol=1e-6)
@@ -0,0 +1,95 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculs import facteur_correction
+from catalogue import (
+    get_types_by_category, get_valeurs_catalogue_par_categorie, get_versions_calibration,
+    enregistrer_calibration
+)
+
+
+@pytest.fixture
+def base(tmp_path):
+    chemin = str(tmp_path / 'equipements.db')
+    conn = sqlite3.connect(chemin)
+    conn.executescript('''
+    CREATE TABLE categories (id INTEGER PRIMARY KEY AUTOINCREMENT, nom TEXT NOT NULL);
+    CREATE TABLE types_equipements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, categorie_id INTEGER, nom TEXT NOT NULL,
+        puissance_moyenne REAL, puissance_min REAL, puissance_max REAL,
+        facteur_charge REAL DEFAULT 70, heures_fonction REAL DEFAULT 10
+    );
+    CREATE TABLE calibrations_catalogue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, version INTEGER NOT NULL, date TEXT, source TEXT,
+        categorie_id INTEGER, facteur_charge REAL, heures_fonction REAL,
+        correction_facteur_charge REAL DEFAULT 1.0, correction_heures REAL DEFAULT 1.0, nb_batiments INTEGER
+    );
+    INSERT INTO categories (nom) VALUES ('CVC'), ('Éclairage');
+    INSERT INTO types_equipements (categorie_id, nom, puissance_moyenne, facteur_charge, heures_fonction)
+    VALUES (1, 'VRV A', 7.0, 70, 10), (1, 'VRV B', 11.0, 90, 20), (2, 'LED', 0.02, 100, 10);
+    ''')
+    conn.commit()
+    conn.close()
+    return chemin
+
+
+def calibration(categorie_id, facteur, heures, nom='CVC'):
+    return pd.DataFrame({
+        'categorie_id': [categorie_id],
+        'Facteur charge calibré (%)': [facteur],
+        'Heures calibrées (h/j)': [heures],
+        'Nombre de bâtiments': [4],
+    }, index=[nom])
+
+
+@pytest.mark.parametrize('cible, attendu', [(88, [77, 99]), (95, [90, 100]), (100, [100, 100])])
+def test_facteur_correction_plafonne(cible, attendu):
+    valeurs = np.array([70.0, 90.0])
+    correction = facteur_correction(valeurs, cible, 100)
+
+    np.testing.assert_allclose(np.minimum(100, valeurs * correction), attendu, rtol=1e-6)
+
+
+def test_catalogue_sans_calibration(base):
+    valeurs = get_valeurs_catalogue_par_categorie(base)
+
+    assert valeurs.loc['CVC', 'facteur_charge'] == pytest.approx(80)
+    assert list(get_types_by_category(1, base)['facteur_charge']) == [70, 90]
+
+
+def test_surcouche_conserve_les_ecarts_entre_types(base):
+    enregistrer_calibration(calibration(1, 88, 18), 'test', base)
+    types_df = get_types_by_category(1, base)
+
+    np.testing.assert_allclose(types_df['facteur_charge'], [77, 99], rtol=1e-6)
+    # 10 h et 20 h × 1.2 = 24 h : plafonné, la moyenne reste 18 h
+    np.testing.assert_allclose(types_df['heures_fonction'], [12, 24], rtol=1e-6)
+
+
+@pytest.mark.parametrize('facteur, heures', [(88, 18), (100, 24), (95, 12)])
+def test_moyenne_affichee_egale_a_la_valeur_calibree(base, facteur, heures):
+    enregistrer_calibration(calibration(1, facteur, heures), 'test', base)
+
+    types_df = get_types_by_category(1, base)
+    valeurs = get_valeurs_catalogue_par_categorie(base)
+
+    assert types_df['facteur_charge'].mean() == pytest.approx(facteur, rel=1e-6)
+    assert types_df['heures_fonction'].mean() == pytest.approx(heures, rel=1e-6)
+    assert valeurs.loc['CVC', 'facteur_charge'] == pytest.approx(facteur, rel=1e-6)
+    assert valeurs.loc['CVC', 'heures_fonction'] == pytest.approx(heures, rel=1e-6)
+
+
+def test_derniere_version_par_categorie(base):
+    enregistrer_calibration(calibration(1, 88, 18), 'premiere', base)
+    version = enregistrer_calibration(calibration(2, 80, 12, 'Éclairage'), 'seconde', base)
+
+    valeurs = get_valeurs_catalogue_par_categorie(base)
+    versions = get_versions_calibration(base)
+
+    assert version == 2
+    assert valeurs.loc['CVC', 'facteur_charge'] == pytest.approx(88, rel=1e-6)
+    assert valeurs.loc['Éclairage', 'facteur_charge'] == pytest.approx(80, rel=1e-6)
+    assert list(versions['version']) == [2, 1]
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculs import TARIF_DEFAUT, calculer_energie_lignes, calculer_couts_lignes, synthese_couts
+
+
+def equipement(puissance, heures, categorie='Autre', batiment='', facteur=100, jours=365):
+    return {
+        'Puissance (kW)': puissance,
+        'Quantité': 1,
+        'Facteur Charge (%)': facteur,
+        'Heures Fonction (h/j)': heures,
+        'Jours Fonction (j/an)': jours,
+        'Catégorie': categorie,
+        'Bâtiment': batiment,
+    }
+
+
+@pytest.fixture
+def coefficients():
+    # Catégorie saisonnière : double en hiver, nulle en été
+    hiver = np.isin(np.arange(1, 13), TARIF_DEFAUT['mois_hiver'])
+    return pd.DataFrame([np.where(hiver, 2.0, 0.0), np.ones(12)],
+                        index=['Chauffage', 'Neutre'], columns=range(1, 13))
+
+
+@pytest.fixture
+def tarif():
+    return {
+        'prix_kwh': {
+            ('Hiver', 'Heures pleines'): 0.4,
+            ('Hiver', 'Heures creuses'): 0.2,
+            ('Été', 'Heures pleines'): 0.3,
+            ('Été', 'Heures creuses'): 0.1,
+        },
+        'prime_puissance': 10.0,
+        'mois_hiver': TARIF_DEFAUT['mois_hiver'],
+        'heures_pleines_par_jour': 16,
+        'part_heures_creuses': {'ECS': 1.0, 'Partielle': 0.1},
+    }
+
+
+def test_energie_repartie_par_saison_et_plage(coefficients, tarif):
+    equipements = pd.DataFrame([equipement(10, 24, 'Neutre', facteur=50)])
+    energie = calculer_energie_lignes(equipements, coefficients, tarif)[0]
+
+    assert energie.sum() == pytest.approx(5 * 24 * 365)
+    # 8 h sur 24 au-delà de la plage pleine
+    assert energie[:, 1].sum() == pytest.approx(5 * 8 * 365)
+    assert energie[0].sum() == pytest.approx(5 * 24 * 151)
+
+
+def test_part_heures_creuses_par_categorie(coefficients, tarif):
+    equipements = pd.DataFrame([
+        equipement(2, 6, 'ECS'), equipement(2, 6, 'Partielle'), equipement(2, 20, 'Partielle'), equipement(2, 6)
+    ])
+    energie = calculer_energie_lignes(equipements, coefficients, tarif)
+    part_creuses = energie[:, :, 1].sum(axis=1) / energie.sum(axis=(1, 2))
+
+    # La part imposée par catégorie n'abaisse pas la part issue des heures au-delà de la plage pleine
+    np.testing.assert_allclose(part_creuses, [1, 0.1, 0.2, 0])
+
+
+def test_coefficients_saisonniers(coefficients, tarif):
+    equipements = pd.DataFrame([equipement(1, 10, 'Chauffage')])
+    energie = calculer_energie_lignes(equipements, coefficients, tarif)[0]
+
+    assert energie[0].sum() == pytest.approx(2 * 10 * 151)
+    assert energie[1].sum() == 0
+
+
+def test_categorie_hors_catalogue_neutre(coefficients, tarif):
+    equipements = pd.DataFrame([equipement(1, 10, 'Neutre'), equipement(1, 10, 'Manuelle')])
+    energie = calculer_energie_lignes(equipements, coefficients, tarif)
+
+    np.testing.assert_allclose(energie[0], energie[1])
+
+
+def test_cout_energie(coefficients, tarif):
+    equipements = pd.DataFrame([equipement(1, 24, 'Neutre')])
+    _, cout_energie, _ = calculer_couts_lignes(equipements, coefficients, tarif)
+
+    attendu = 151 * (16 * 0.4 + 8 * 0.2) + 214 * (16 * 0.3 + 8 * 0.1)
+    assert cout_energie[0] == pytest.approx(attendu)
+
+
+def test_puissance_souscrite_par_defaut(coefficients, tarif):
+    equipements = pd.DataFrame([equipement(6, 8, 'Neutre', 'A', facteur=50), equipement(4, 8, 'Neutre', 'B')])
+    _, _, cout_abonnement = calculer_couts_lignes(equipements, coefficients, tarif)
+
+    np.testing.assert_allclose(cout_abonnement, [30, 40])
+
+
+def test_puissance_souscrite_du_site_repartie(coefficients, tarif):
+    equipements = pd.DataFrame([equipement(3, 8, 'Neutre', 'A'), equipement(1, 8, 'Neutre', 'B')])
+    _, _, cout_abonnement = calculer_couts_lignes(equipements, coefficients, tarif, puissance_souscrite=12)
+
+    assert cout_abonnement.sum() == pytest.approx(120)
+    np.testing.assert_allclose(cout_abonnement, [90, 30])
+
+
+def test_puissance_souscrite_par_batiment(coefficients, tarif):
+    equipements = pd.DataFrame([
+        equipement(3, 8, 'Neutre', 'A'), equipement(1, 8, 'Neutre', 'A'), equipement(5, 8, 'Neutre', 'B')
+    ])
+    _, _, cout_abonnement = calculer_couts_lignes(equipements, coefficients, tarif, puissance_souscrite={'A': 8})
+
+    np.testing.assert_allclose(cout_abonnement, [60, 20, 50])
+
+
+def test_synthese_par_batiment(coefficients, tarif):
+    equipements = pd.DataFrame([
+        equipement(1, 8, 'Neutre', 'A'), equipement(2, 8, 'Chauffage', 'A'), equipement(5, 8, 'Neutre', 'B')
+    ])
+    synthese = synthese_couts(equipements, coefficients, tarif, cle='Bâtiment').set_index('Bâtiment')
+
+    lignes = synthese_couts(equipements, coefficients, tarif)
+    assert synthese['Coût total (€/an)'].sum() == pytest.approx(lignes['Coût total (€/an)'].sum())
+    assert synthese.loc['A', 'Coût abonnement (€/an)'] == pytest.approx(30)
+    assert synthese.loc['B', 'Énergie (kWh/an)'] == pytest.approx(5 * 8 * 365)